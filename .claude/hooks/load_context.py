@@ -40,6 +40,7 @@ SHORT_MSG_THRESHOLD = 15
 ASSISTANT_MAX_LEN = 800
 USER_MAX_LEN = 2000
 SESSION_GAP_MINUTES = 30
+TASK_ICONS = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}
 
 
 # ── Message history (short-term) ─────────────────────────────────────
@@ -49,8 +50,15 @@ def get_recent_messages():
         return []
     try:
         conn = sqlite3.connect(DB_PATH)
+        # This hook doesn't migrate: fall back to the legacy metadata blob until
+        # db.py has added and backfilled the created_at column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        created_at = (
+            "created_at" if "created_at" in columns
+            else "json_extract(metadata, '$.created_at')"
+        )
         cursor = conn.execute(
-            """SELECT role, content, metadata, source, content_hash, id
+            f"""SELECT role, content, {created_at}, source, content_hash, id
                FROM messages ORDER BY id DESC LIMIT ?""",
             (FETCH_LIMIT,),
         )
@@ -77,7 +85,7 @@ def dedup_cross_source(rows):
     """When CC and TG have similar assistant messages close together, keep TG only."""
     to_remove = set()
     for i, row in enumerate(rows):
-        role, content, _meta, source, _hash, msg_id = row
+        role, content, _created, source, _hash, msg_id = row
         if role != "assistant" or source != "claude-code":
             continue
         for j in range(max(0, i - 3), min(len(rows), i + 4)):
@@ -112,17 +120,13 @@ def smart_truncate(content, max_len):
     return content[:max_len] + "..."
 
 
-def parse_timestamp(metadata):
-    if not metadata:
+def parse_timestamp(created_at):
+    if not created_at:
         return None
     try:
-        meta = json.loads(metadata)
-        ts = meta.get("created_at", "")
-        if ts:
-            return datetime.fromisoformat(ts.replace("Z", "+00:00"))
-    except (json.JSONDecodeError, ValueError):
-        pass
-    return None
+        return datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
 
 
 def format_source(source):
@@ -236,7 +240,7 @@ def build_tasks_context(tasks):
         return ""
     lines = ["[Active tasks]"]
     for title, status, context, updated_at in tasks:
-        icon = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}.get(status, "[ ]")
+        icon = TASK_ICONS.get(status, "[ ]")
         line = f"  {icon} {title}"
         if context:
             line += f" — {context[:100]}"
@@ -250,9 +254,8 @@ def build_messages_context(rows, char_budget):
     total_chars = 0
 
     for row in reversed(rows):
-        role, content, metadata, source, _hash, _id = row
-        meta = json.loads(metadata) if metadata else {}
-        created = meta.get("created_at", "")[:19]
+        role, content, created_at, source, _hash, _id = row
+        created = (created_at or "")[:19]
         src = format_source(source)
         prefix = "Oneup" if role == "user" else os.environ.get("ASSISTANT_NAME", "Nova")
 
@@ -263,14 +266,14 @@ def build_messages_context(rows, char_budget):
         if total_chars + len(line) > char_budget:
             break
         total_chars += len(line)
-        entries.append((line, metadata))
+        entries.append((line, created_at))
 
     entries.reverse()
 
     lines = []
     prev_time = None
-    for line, metadata in entries:
-        curr_time = parse_timestamp(metadata)
+    for line, created_at in entries:
+        curr_time = parse_timestamp(created_at)
         if prev_time and curr_time:
             gap = (curr_time - prev_time).total_seconds() / 60
             if gap > SESSION_GAP_MINUTES:
@@ -16,6 +16,18 @@ PROJECT_ROOT = str(Path(__file__).resolve().parent.parent.parent)
 sys.path.insert(0, PROJECT_ROOT)
 from db import save_message, save_summary, save_fact, save_task
 
+_CONTINUE = '{"continue": true}'  # Constant hook reply, no need to encode it
+
+_FACT_PATTERNS = [
+    re.compile(
+        r"(?:retiens?|remember|note|rappelle[- ]toi|n'oublie pas|oublie pas)\s+(?:que\s+)?(.+)",
+        re.IGNORECASE,
+    ),
+    re.compile(r"(?:toujours|always)\s+(.+)", re.IGNORECASE),
+    re.compile(r"(?:jamais|never)\s+(.+)", re.IGNORECASE),
+    re.compile(r"(?:je pr[eé]f[eè]re?|i prefer)\s+(.+)", re.IGNORECASE),
+]
+
 
 def main():
     data = json.load(sys.stdin)
@@ -42,20 +54,14 @@ def main():
                 _save_from_transcript(session_id, transcript_path)
             _generate_session_summary(session_id, transcript_path)
 
-    json.dump({"continue": True}, sys.stdout)
+    sys.stdout.write(_CONTINUE)
 
 
 def _extract_facts(user_message):
     """Detect 'remember that...' patterns and persist as facts."""
-    patterns = [
-        r"(?:retiens?|remember|note|rappelle[- ]toi|n'oublie pas|oublie pas)\s+(?:que\s+)?(.+)",
-        r"(?:toujours|always)\s+(.+)",
-        r"(?:jamais|never)\s+(.+)",
-        r"(?:je pr[eé]f[eè]re?|i prefer)\s+(.+)",
-    ]
     lower = user_message.lower().strip()
-    for pattern in patterns:
-        match = re.search(pattern, lower, re.IGNORECASE)
+    for pattern in _FACT_PATTERNS:
+        match = pattern.search(lower)
         if match:
             fact = match.group(1).strip().rstrip(".")
             if len(fact) > 10:  # Skip very short matches
@@ -161,10 +167,10 @@ def _save_from_transcript(session_id, transcript_path):
     """Fallback: extract the LAST assistant message from JSONL transcript."""
     try:
         last_text = None
-        with open(transcript_path, "r") as f:
+        with open(transcript_path, "rb") as f:
             for line in f:
-                line = line.strip()
-                if not line:
+                # Only assistant entries matter; skip decoding everything else
+                if b'"assistant"' not in line:
                     continue
                 try:
                     entry = json.loads(line)
@@ -179,7 +185,7 @@ def _save_from_transcript(session_id, transcript_path):
                                 text_parts.append(part.get("text", ""))
                         if text_parts:
                             last_text = "\n".join(text_parts)
-                except json.JSONDecodeError:
+                except (json.JSONDecodeError, UnicodeDecodeError):
                     continue
         if last_text:
             save_message("assistant", last_text, source="claude-code", session_id=session_id)
@@ -4,6 +4,7 @@ import asyncio
 import logging
 import os
 import re
+import stat
 import time
 
 from dotenv import load_dotenv
@@ -15,20 +16,30 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
+from telegramify_markdown import Text
 
 from claude_runner import run_claude, stream_claude
 from config import Config
-from db import save_message, save_fact, save_task, complete_task, get_active_facts, get_active_tasks, get_recent_summaries
-from formatting import (
-    format_response,
-    is_plain_text,
-    is_text_content,
-    sanitize_output,
+from db import (
+    TASK_ICONS,
+    complete_task,
+    deactivate_facts,
+    get_active_facts,
+    get_active_tasks,
+    get_recent_summaries,
+    save_fact,
+    save_message,
+    save_task,
 )
+from formatting import format_response, sanitize_output
 
 # Claude Code slash commands available from Telegram
 CLAUDE_COMMANDS_DIR = os.path.expanduser("~/.claude/commands")
 CLAUDE_COMMANDS = ["check", "test", "review", "learn", "workflow"]
+_COMMAND_CACHE: dict[str, tuple[tuple[int, int], str]] = {}  # path -> ((mtime_ns, size), text)
+
+STREAM_DISPLAY_LIMIT = 4000  # Truncate display during stream, keep full buffer
+STREAM_MIN_EDIT_DELTA = 64  # Don't spend a Telegram edit on a few new chars
 
 logger = logging.getLogger(__name__)
 
@@ -55,31 +66,50 @@ def _extract_facts_from_message(text: str) -> None:
                 break
 
 
-async def send_typing_periodically(
-    chat_id: int, bot, stop_event: asyncio.Event
-) -> None:
-    """Send TYPING action every 4s until stop_event is set."""
-    while not stop_event.is_set():
+class TypingIndicator:
+    """Send the TYPING action every 4s via loop.call_later until stopped."""
+
+    def __init__(self, chat_id: int, bot) -> None:
+        self._chat_id = chat_id
+        self._bot = bot
+        self._handle: asyncio.TimerHandle | None = None
+        self._pending: asyncio.Future | None = None
+
+    def start(self) -> "TypingIndicator":
+        self._tick()
+        return self
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        # Don't let a late action re-show "typing..." after the reply
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+
+    def _tick(self) -> None:
+        # At most one action in flight, so stop() always cancels the only one
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.ensure_future(self._send())
+        self._handle = asyncio.get_running_loop().call_later(4.0, self._tick)
+
+    async def _send(self) -> None:
         try:
-            await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            await self._bot.send_chat_action(chat_id=self._chat_id, action=ChatAction.TYPING)
         except Exception:
             pass
-        try:
-            await asyncio.wait_for(stop_event.wait(), timeout=4.0)
-        except asyncio.TimeoutError:
-            pass
 
 
 async def send_chunks(update: Update, chunks: list) -> None:
     """Send formatted content chunks to the user."""
     for item in chunks:
         try:
-            if is_plain_text(item):
+            if isinstance(item, str):
                 await update.message.reply_text(
                     item,
                     disable_web_page_preview=True,
                 )
-            elif is_text_content(item):
+            elif isinstance(item, Text):
                 await update.message.reply_text(
                     item.content,
                     parse_mode="MarkdownV2",
@@ -89,12 +119,58 @@ async def send_chunks(update: Update, chunks: list) -> None:
             # Fallback: send as plain text without MarkdownV2
             logger.warning("Failed to send formatted chunk: %s", e)
             try:
-                text = item if is_plain_text(item) else getattr(item, "content", str(item))
+                text = item if isinstance(item, str) else getattr(item, "content", str(item))
                 await update.message.reply_text(text, disable_web_page_preview=True)
             except Exception as e2:
                 logger.error("Failed to send chunk even as plain text: %s", e2)
 
 
+async def _stream_into_message(prompt: str, config: Config, streaming_msg) -> str:
+    """Stream Claude's reply into streaming_msg with periodic edits.
+
+    Returns the full response text. Errors from stream_claude propagate.
+    """
+    parts: list[str] = []
+    total_len = 0
+    head = ""  # First STREAM_DISPLAY_LIMIT chars, the only part ever displayed
+    last_edit = 0.0
+    last_edit_len = 0
+    last_display = ""
+
+    async for chunk in stream_claude(prompt, config):
+        if chunk is None:
+            # Stream complete
+            break
+        parts.append(chunk)
+        total_len += len(chunk)
+        if len(head) < STREAM_DISPLAY_LIMIT:
+            head += chunk[:STREAM_DISPLAY_LIMIT - len(head)]
+
+        now = time.monotonic()
+        if (
+            now - last_edit >= config.stream_edit_interval
+            and total_len - last_edit_len >= STREAM_MIN_EDIT_DELTA
+        ):
+            display = head
+            if total_len > STREAM_DISPLAY_LIMIT:
+                display += "\n\n... (streaming)"
+            # Past the display limit the text stops changing; skip no-op edits
+            if display == last_display:
+                continue
+            try:
+                await streaming_msg.edit_text(
+                    display + config.stream_indicator,
+                    disable_web_page_preview=True,
+                )
+                last_edit = now
+                last_edit_len = total_len
+                last_display = display
+            except Exception as e:
+                logger.warning("Stream edit failed: %s", e)
+
+    return "".join(parts)
+
+
 async def handle_message(update: Update, context) -> None:
     """Handle incoming text messages: forward to Claude CLI and reply."""
     chat_id = update.message.chat_id
@@ -102,14 +178,11 @@ async def handle_message(update: Update, context) -> None:
     config: Config = context.bot_data["config"]
 
     logger.info("Message received from chat_id=%d (%d chars)", chat_id, len(user_text))
-    save_message("user", user_text, source="telegram")
-    _extract_facts_from_message(user_text)
+    await asyncio.to_thread(save_message, "user", user_text, source="telegram")
+    await asyncio.to_thread(_extract_facts_from_message, user_text)
 
     # Start typing indicator
-    stop_typing = asyncio.Event()
-    typing_task = asyncio.create_task(
-        send_typing_periodically(chat_id, context.bot, stop_typing)
-    )
+    typing_indicator = TypingIndicator(chat_id, context.bot).start()
 
     name = config.assistant_name
     try:
@@ -128,11 +201,10 @@ async def handle_message(update: Update, context) -> None:
         await update.message.reply_text(f"Erreur inattendue : {type(e).__name__}")
         return
     finally:
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
 
     logger.info("%s responded (%d chars)", name, len(response))
-    save_message("assistant", response, source="telegram")
+    await asyncio.to_thread(save_message, "assistant", response, source="telegram")
 
     chunks = await format_response(response, config.max_message_length)
     await send_chunks(update, chunks)
@@ -149,14 +221,11 @@ async def handle_message_streaming(update: Update, context) -> None:
         return await handle_message(update, context)
 
     logger.info("Message received (stream) from chat_id=%d (%d chars)", chat_id, len(user_text))
-    save_message("user", user_text, source="telegram")
-    _extract_facts_from_message(user_text)
+    await asyncio.to_thread(save_message, "user", user_text, source="telegram")
+    await asyncio.to_thread(_extract_facts_from_message, user_text)
 
     # Start typing indicator
-    stop_typing = asyncio.Event()
-    typing_task = asyncio.create_task(
-        send_typing_periodically(chat_id, context.bot, stop_typing)
-    )
+    typing_indicator = TypingIndicator(chat_id, context.bot).start()
 
     # Send initial placeholder message
     streaming_msg = await update.message.reply_text(
@@ -164,34 +233,10 @@ async def handle_message_streaming(update: Update, context) -> None:
         disable_web_page_preview=True,
     )
 
-    buffer = ""
-    last_edit = 0.0
-    display_limit = 4000  # Truncate display during stream, keep full buffer
-
     try:
-        async for chunk in stream_claude(user_text, config):
-            if chunk is None:
-                # Stream complete
-                break
-            buffer += chunk
-
-            now = time.monotonic()
-            if now - last_edit >= config.stream_edit_interval:
-                display = buffer[:display_limit]
-                if len(buffer) > display_limit:
-                    display += "\n\n... (streaming)"
-                try:
-                    await streaming_msg.edit_text(
-                        display + config.stream_indicator,
-                        disable_web_page_preview=True,
-                    )
-                    last_edit = now
-                except Exception as e:
-                    logger.warning("Stream edit failed: %s", e)
-
+        buffer = await _stream_into_message(user_text, config, streaming_msg)
     except TimeoutError:
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
         try:
             await streaming_msg.edit_text(f"Timeout : {config.assistant_name} n'a pas répondu à temps.")
         except Exception:
@@ -199,8 +244,7 @@ async def handle_message_streaming(update: Update, context) -> None:
         return
     except RuntimeError as e:
         logger.error("Stream error: %s", e)
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
         try:
             await streaming_msg.edit_text(f"Erreur {config.assistant_name} : {e}")
         except Exception:
@@ -208,16 +252,14 @@ async def handle_message_streaming(update: Update, context) -> None:
         return
     except Exception as e:
         logger.error("Unexpected stream error: %s", e)
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
         try:
             await streaming_msg.edit_text(f"Erreur inattendue : {type(e).__name__}")
         except Exception:
             pass
         return
     finally:
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
 
     if not buffer.strip():
         try:
@@ -227,7 +269,7 @@ async def handle_message_streaming(update: Update, context) -> None:
         return
 
     logger.info("Stream complete (%d chars)", len(buffer))
-    save_message("assistant", buffer, source="telegram")
+    await asyncio.to_thread(save_message, "assistant", buffer, source="telegram")
 
     # Delete the streaming message, send properly formatted response
     try:
@@ -240,6 +282,29 @@ async def handle_message_streaming(update: Update, context) -> None:
     await send_chunks(update, chunks)
 
 
+def _read_command_file(cmd_name: str) -> str | None:
+    """Return the contents of a Claude command .md file, or None if missing.
+
+    Contents are cached and re-read only when the file's mtime or size changes.
+    """
+    cmd_file = os.path.join(CLAUDE_COMMANDS_DIR, f"{cmd_name}.md")
+    try:
+        st = os.stat(cmd_file)
+    except OSError:
+        _COMMAND_CACHE.pop(cmd_file, None)
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _COMMAND_CACHE.get(cmd_file)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(cmd_file) as f:
+        prompt = f.read()
+    _COMMAND_CACHE[cmd_file] = (key, prompt)
+    return prompt
+
+
 async def handle_claude_command(update: Update, context) -> None:
     """Handle Claude Code slash commands (/check, /test, /review, etc.).
 
@@ -255,61 +320,34 @@ async def handle_claude_command(update: Update, context) -> None:
     arguments = parts[1] if len(parts) > 1 else ""
 
     # Read the command file
-    cmd_file = os.path.join(CLAUDE_COMMANDS_DIR, f"{cmd_name}.md")
-    if not os.path.isfile(cmd_file):
+    prompt = await asyncio.to_thread(_read_command_file, cmd_name)
+    if prompt is None:
         await update.message.reply_text(
             f"Commande /{cmd_name} introuvable.",
             disable_web_page_preview=True,
         )
         return
 
-    with open(cmd_file) as f:
-        prompt = f.read()
-
     # Substitute $ARGUMENTS placeholder
     prompt = prompt.replace("$ARGUMENTS", arguments)
 
     logger.info("Claude command /%s from chat_id=%d (args=%r)", cmd_name, chat_id, arguments)
-    save_message("user", f"/{cmd_name} {arguments}".strip(), source="telegram")
+    await asyncio.to_thread(
+        save_message, "user", f"/{cmd_name} {arguments}".strip(), source="telegram"
+    )
 
     # Use streaming handler logic
-    stop_typing = asyncio.Event()
-    typing_task = asyncio.create_task(
-        send_typing_periodically(chat_id, context.bot, stop_typing)
-    )
+    typing_indicator = TypingIndicator(chat_id, context.bot).start()
 
     streaming_msg = await update.message.reply_text(
         f"Exécution de /{cmd_name}...",
         disable_web_page_preview=True,
     )
 
-    buffer = ""
-    last_edit = 0.0
-    display_limit = 4000
-
     try:
-        async for chunk in stream_claude(prompt, config):
-            if chunk is None:
-                break
-            buffer += chunk
-
-            now = time.monotonic()
-            if now - last_edit >= config.stream_edit_interval:
-                display = buffer[:display_limit]
-                if len(buffer) > display_limit:
-                    display += "\n\n... (streaming)"
-                try:
-                    await streaming_msg.edit_text(
-                        display + config.stream_indicator,
-                        disable_web_page_preview=True,
-                    )
-                    last_edit = now
-                except Exception as e:
-                    logger.warning("Stream edit failed: %s", e)
-
+        buffer = await _stream_into_message(prompt, config, streaming_msg)
     except TimeoutError:
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
         try:
             await streaming_msg.edit_text(
                 f"Timeout : /{cmd_name} n'a pas répondu à temps."
@@ -319,16 +357,14 @@ async def handle_claude_command(update: Update, context) -> None:
         return
     except (RuntimeError, Exception) as e:
         logger.error("Command /%s error: %s", cmd_name, e)
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
         try:
             await streaming_msg.edit_text(f"Erreur /{cmd_name} : {e}")
         except Exception:
             pass
         return
     finally:
-        stop_typing.set()
-        await typing_task
+        typing_indicator.stop()
 
     if not buffer.strip():
         try:
@@ -338,7 +374,7 @@ async def handle_claude_command(update: Update, context) -> None:
         return
 
     logger.info("Command /%s complete (%d chars)", cmd_name, len(buffer))
-    save_message("assistant", buffer, source="telegram")
+    await asyncio.to_thread(save_message, "assistant", buffer, source="telegram")
 
     try:
         await streaming_msg.delete()
@@ -361,9 +397,9 @@ async def handle_start(update: Update, context) -> None:
 
 async def handle_memory(update: Update, context) -> None:
     """Handle /memory command — show memory status."""
-    facts = get_active_facts()
-    tasks = get_active_tasks()
-    summaries = get_recent_summaries(limit=3)
+    facts = await asyncio.to_thread(get_active_facts)
+    tasks = await asyncio.to_thread(get_active_tasks)
+    summaries = await asyncio.to_thread(get_recent_summaries, limit=3)
 
     lines = ["**Etat de la mémoire**\n"]
 
@@ -379,7 +415,7 @@ async def handle_memory(update: Update, context) -> None:
     lines.append(f"\n**Tâches actives** ({len(tasks)}):")
     if tasks:
         for title, status, ctx, _ in tasks:
-            icon = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}.get(status, "[ ]")
+            icon = TASK_ICONS.get(status, "[ ]")
             lines.append(f"  {icon} {title}")
     else:
         lines.append("  (aucune)")
@@ -408,7 +444,7 @@ async def handle_remember(update: Update, context) -> None:
         )
         return
     fact = " ".join(context.args)
-    save_fact(fact, category="user_note", source="telegram")
+    await asyncio.to_thread(save_fact, fact, category="user_note", source="telegram")
     await update.message.reply_text(
         f"Retenu : {fact}",
         disable_web_page_preview=True,
@@ -426,7 +462,7 @@ async def handle_tasks(update: Update, context) -> None:
     args = context.args or []
 
     if not args:
-        tasks = get_active_tasks()
+        tasks = await asyncio.to_thread(get_active_tasks)
         if not tasks:
             await update.message.reply_text(
                 "Aucune tâche active.",
@@ -434,9 +470,8 @@ async def handle_tasks(update: Update, context) -> None:
             )
             return
         lines = ["**Tâches actives**\n"]
-        icons = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}
         for title, status, ctx, updated_at in tasks:
-            icon = icons.get(status, "[ ]")
+            icon = TASK_ICONS.get(status, "[ ]")
             lines.append(f"  {icon} {title}")
         await update.message.reply_text(
             "\n".join(lines),
@@ -448,13 +483,13 @@ async def handle_tasks(update: Update, context) -> None:
     text = " ".join(args[1:])
 
     if action == "add" and text:
-        save_task(text, status="pending")
+        await asyncio.to_thread(save_task, text, status="pending")
         await update.message.reply_text(
             f"Tâche ajoutée : {text}",
             disable_web_page_preview=True,
         )
     elif action == "done" and text:
-        complete_task(text)
+        await asyncio.to_thread(complete_task, text)
         await update.message.reply_text(
             f"Tâche terminée : {text}",
             disable_web_page_preview=True,
@@ -475,27 +510,8 @@ async def handle_forget(update: Update, context) -> None:
         )
         return
     search = " ".join(context.args).lower()
-    # Find and deactivate matching facts
-    from db import get_connection, _init_memory_tables
-    try:
-        conn = get_connection()
-        try:
-            _init_memory_tables(conn)
-            rows = conn.execute(
-                "SELECT id, content FROM facts WHERE active = 1"
-            ).fetchall()
-            deactivated = []
-            for row in rows:
-                if search in row["content"].lower():
-                    conn.execute(
-                        "UPDATE facts SET active = 0 WHERE id = ?", (row["id"],)
-                    )
-                    deactivated.append(row["content"])
-            conn.commit()
-        finally:
-            conn.close()
-    except Exception as e:
-        logger.warning("Failed to forget fact: %s", e)
+    deactivated = await asyncio.to_thread(deactivate_facts, search)
+    if deactivated is None:
         await update.message.reply_text("Erreur lors de la suppression.")
         return
 
@@ -1,25 +1,57 @@
 """Async wrapper for claude CLI subprocess execution."""
 
 import asyncio
-import json
 import logging
 import os
 from collections.abc import AsyncGenerator
 
+import orjson
+
 from config import Config
-from db import get_active_facts, get_active_tasks, get_recent_summaries
+from db import TASK_ICONS, get_active_facts, get_active_tasks, get_recent_summaries
 
 logger = logging.getLogger(__name__)
 
+STREAM_READ_SIZE = 1 << 16  # One read per 64 KiB instead of one per line
+
+
+_ENV_CACHE: dict[str, str] | None = None
+
 
 def _claude_env() -> dict[str, str]:
-    """Return env with writable TMPDIR."""
-    env = os.environ.copy()
-    env["NO_COLOR"] = "1"
-    tmpdir = os.path.expanduser("~/tmp")
-    os.makedirs(tmpdir, exist_ok=True)
-    env["TMPDIR"] = tmpdir
-    return env
+    """Return env with writable TMPDIR (built once, then reused read-only)."""
+    global _ENV_CACHE
+    if _ENV_CACHE is None:
+        env = os.environ.copy()
+        env["NO_COLOR"] = "1"
+        env["TMPDIR"] = os.path.expanduser("~/tmp")
+        _ENV_CACHE = env
+    # Not cached: a tmp cleaner may remove the directory while the bot runs
+    os.makedirs(_ENV_CACHE["TMPDIR"], exist_ok=True)
+    return _ENV_CACHE
+
+
+async def _iter_lines(
+    stream: asyncio.StreamReader, timeout: float
+) -> AsyncGenerator[bytes, None]:
+    """Yield lines from stream, reading STREAM_READ_SIZE bytes at a time.
+
+    Raises:
+        asyncio.TimeoutError: If no output arrives for timeout seconds.
+    """
+    buf = bytearray()
+    while True:
+        chunk = await asyncio.wait_for(stream.read(STREAM_READ_SIZE), timeout=timeout)
+        if not chunk:
+            if buf:
+                yield bytes(buf)
+            return
+        buf += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line
 
 
 def _build_memory_context() -> str:
@@ -49,9 +81,8 @@ def _build_memory_context() -> str:
     tasks = get_active_tasks()
     if tasks:
         lines = ["[Active tasks]"]
-        icons = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}
         for title, status, context, _ in tasks:
-            icon = icons.get(status, "[ ]")
+            icon = TASK_ICONS.get(status, "[ ]")
             lines.append(f"  {icon} {title}")
         sections.append("\n".join(lines))
 
@@ -74,7 +105,7 @@ async def run_claude(message: str, config: Config) -> str:
         TimeoutError: If claude takes longer than config.claude_timeout.
         RuntimeError: If claude exits with non-zero code or empty response.
     """
-    memory = _build_memory_context()
+    memory = await asyncio.to_thread(_build_memory_context)
     system = config.system_prompt
     if memory:
         system = f"{system}\n\n{memory}"
@@ -109,28 +140,28 @@ async def run_claude(message: str, config: Config) -> str:
             f"Claude did not respond within {config.claude_timeout}s"
         )
 
-    if stderr:
-        logger.warning("claude stderr: %s", stderr.decode(errors="replace").strip())
+    # Decoded once, and only when there is something to report
+    err = stderr.decode(errors="replace").strip() if stderr else ""
+    if err:
+        logger.warning("claude stderr: %s", err)
 
     if process.returncode != 0:
-        err = stderr.decode(errors="replace").strip()
         raise RuntimeError(f"claude exited with code {process.returncode}: {err}")
 
-    raw = stdout.decode(errors="replace").strip()
-    if not raw:
+    if not stdout.strip():
         raise RuntimeError("claude returned empty output")
 
-    # Parse JSON output, extract result field
+    # Parse JSON output straight from bytes, extract result field
     try:
-        data = json.loads(raw)
+        data = orjson.loads(stdout)
         result = data.get("result", "")
         if not result:
             raise RuntimeError("claude returned empty result field")
         return result
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         # Fallback: return raw stdout if JSON parsing fails
         logger.warning("Failed to parse claude JSON output, using raw stdout")
-        return raw
+        return stdout.decode(errors="replace").strip()
 
 
 async def stream_claude(message: str, config: Config) -> AsyncGenerator[str | None, None]:
@@ -147,7 +178,7 @@ async def stream_claude(message: str, config: Config) -> AsyncGenerator[str | No
         TimeoutError: If no output received for config.claude_timeout seconds.
         RuntimeError: If claude exits with non-zero code.
     """
-    memory = _build_memory_context()
+    memory = await asyncio.to_thread(_build_memory_context)
     system = config.system_prompt
     if memory:
         system = f"{system}\n\n{memory}"
@@ -174,29 +205,11 @@ async def stream_claude(message: str, config: Config) -> AsyncGenerator[str | No
 
     got_text = False
     try:
-        while True:
+        async for line in _iter_lines(process.stdout, config.claude_timeout):
+            # orjson parses the raw bytes; blank lines fail and are skipped
             try:
-                line = await asyncio.wait_for(
-                    process.stdout.readline(),
-                    timeout=config.claude_timeout,
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
-                raise TimeoutError(
-                    f"Claude did not respond within {config.claude_timeout}s"
-                )
-
-            if not line:
-                break
-
-            raw = line.decode(errors="replace").strip()
-            if not raw:
-                continue
-
-            try:
-                data = json.loads(raw)
-            except json.JSONDecodeError:
+                data = orjson.loads(line)
+            except orjson.JSONDecodeError:
                 continue
 
             msg_type = data.get("type")
@@ -218,6 +231,12 @@ async def stream_claude(message: str, config: Config) -> AsyncGenerator[str | No
                 yield None
                 return
 
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise TimeoutError(
+            f"Claude did not respond within {config.claude_timeout}s"
+        )
     finally:
         if process.returncode is None:
             process.kill()
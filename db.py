@@ -1,9 +1,9 @@
 """Shared SQLite database module for conversation persistence."""
 
 import hashlib
-import json
 import logging
 import sqlite3
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -11,16 +11,38 @@ logger = logging.getLogger(__name__)
 
 DB_PATH = str(Path(__file__).resolve().parent / "database.db")
 MAX_MESSAGES = 5000
-_db_initialized: set[str] = set()
+ROTATE_EVERY = 256  # Inserts between rotation passes
+SCHEMA_VERSION = 4
+_connections: dict[str, sqlite3.Connection] = {}
+_lock = threading.RLock()
 
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    if DB_PATH not in _db_initialized:
-        _init_db(conn)
-        _db_initialized.add(DB_PATH)
-    return conn
+    """Return the process-wide connection for DB_PATH, opening it on first use."""
+    conn = _connections.get(DB_PATH)
+    if conn is not None:
+        return conn
+    with _lock:
+        conn = _connections.get(DB_PATH)
+        if conn is not None:
+            return conn
+        # Shared across threads (bot handlers use asyncio.to_thread); _lock
+        # serializes every use
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Per-connection settings; journal_mode=WAL persists in the file itself
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA mmap_size=134217728")
+        # Hooks run once per process, so skip the DDL when the file is current
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.execute("PRAGMA journal_mode=WAL")
+            _init_db(conn)
+            _init_memory_tables(conn)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        _connections[DB_PATH] = conn
+        return conn
 
 
 def _init_db(conn):
@@ -31,25 +53,46 @@ def _init_db(conn):
             content TEXT NOT NULL,
             metadata TEXT,
             source TEXT DEFAULT 'claude-code',
-            content_hash TEXT
+            content_hash TEXT,
+            session_id TEXT,
+            created_at TEXT
         )
     """)
-    # Add content_hash column if missing (migration)
+    # Add columns if missing (migration)
+    for column in ("content_hash", "session_id", "created_at"):
+        try:
+            conn.execute(f"ALTER TABLE messages ADD COLUMN {column} TEXT")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    # Rows written before the columns existed keep these in the metadata blob
     try:
-        conn.execute("ALTER TABLE messages ADD COLUMN content_hash TEXT")
+        conn.execute("""
+            UPDATE messages SET
+                session_id = json_extract(metadata, '$.session_id'),
+                created_at = json_extract(metadata, '$.created_at')
+            WHERE created_at IS NULL AND json_valid(metadata)
+        """)
     except sqlite3.OperationalError:
-        pass  # Column already exists
+        pass  # SQLite built without JSON1
     conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_source ON messages (source)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_role ON messages (role)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_id_desc ON messages (id DESC)")
+    # Covering index for _is_duplicate: latest hash per role without a table lookup
     conn.execute(
-        "CREATE INDEX IF NOT EXISTS idx_messages_hash ON messages (role, content_hash)"
+        "CREATE INDEX IF NOT EXISTS idx_messages_role_latest "
+        "ON messages (role, id DESC, content_hash)"
     )
+    # Superseded by idx_messages_role_latest (migration)
+    conn.execute("DROP INDEX IF EXISTS idx_messages_role")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_hash")
     conn.commit()
 
 
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
 def _content_hash(text):
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
 
 
 def _is_duplicate(conn, role, c_hash):
@@ -69,27 +112,25 @@ def save_message(role, content, source="claude-code", session_id=""):
         return
     try:
         conn = get_connection()
-        try:
+        with _lock, conn:
+            # Take the write lock up front so dedup check and insert are atomic
+            # against the other process (bot vs. hook) writing the same turn
+            conn.execute("BEGIN IMMEDIATE")
             c_hash = _content_hash(content)
 
             if _is_duplicate(conn, role, c_hash):
                 return
 
-            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-            metadata = json.dumps({
-                "session_id": session_id,
-                "created_at": now,
-                "content_hash": c_hash,
-            })
-            conn.execute(
-                "INSERT INTO messages (role, content, metadata, source, content_hash) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (role, content, metadata, source, c_hash),
+            cursor = conn.execute(
+                "INSERT INTO messages "
+                "(role, content, source, content_hash, session_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (role, content, source, c_hash, session_id, _now_iso()),
             )
-            conn.commit()
-            _maybe_rotate(conn)
-        finally:
-            conn.close()
+            # AUTOINCREMENT ids are shared by every writer process, so this
+            # rotates once per ROTATE_EVERY inserts whoever does them
+            if cursor.lastrowid % ROTATE_EVERY == 0:
+                _maybe_rotate(conn)
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         logger.warning("Failed to save message: %s", e)
 
@@ -97,15 +138,13 @@ def save_message(role, content, source="claude-code", session_id=""):
 def _maybe_rotate(conn):
     """Keep only the last MAX_MESSAGES rows."""
     try:
-        count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
-        if count > MAX_MESSAGES:
-            conn.execute(
-                """DELETE FROM messages WHERE id NOT IN (
-                    SELECT id FROM messages ORDER BY id DESC LIMIT ?
-                )""",
-                (MAX_MESSAGES,),
-            )
-            conn.commit()
+        # Cutoff is found by walking the id index; no COUNT(*) or NOT IN scan
+        conn.execute(
+            """DELETE FROM messages WHERE id <= (
+                SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?
+            )""",
+            (MAX_MESSAGES,),
+        )
     except (sqlite3.DatabaseError, sqlite3.OperationalError):
         pass
 
@@ -114,6 +153,7 @@ def _maybe_rotate(conn):
 
 MAX_SUMMARIES = 50  # keep last 50 session summaries (~25 days at 2/day)
 MAX_TASKS = 200
+TASK_ICONS = {"pending": "[ ]", "in_progress": "[>]", "blocked": "[!]"}
 
 
 def _init_memory_tables(conn):
@@ -150,7 +190,14 @@ def _init_memory_tables(conn):
     """)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_facts_active ON facts (active)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_facts_category ON facts (category)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_tasks_status ON memory_tasks (status)")
+    # get_active_tasks filters on status != 'done', which a plain status index
+    # can't serve; a partial index keeps active tasks pre-sorted by id
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_memory_tasks_active "
+        "ON memory_tasks (id) WHERE status != 'done'"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_tasks_title ON memory_tasks (title)")
+    conn.execute("DROP INDEX IF EXISTS idx_memory_tasks_status")  # Superseded (migration)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_created ON summaries (created_at DESC)")
     conn.commit()
 
@@ -161,18 +208,14 @@ def save_summary(session_id, summary, decisions="", files_modified=""):
         return
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
-            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        with _lock, conn:
+            now = _now_iso()
             conn.execute(
                 "INSERT INTO summaries (session_id, summary, decisions, files_modified, created_at) "
                 "VALUES (?, ?, ?, ?, ?)",
                 (session_id, summary.strip(), decisions, files_modified, now),
             )
-            conn.commit()
             _rotate_summaries(conn)
-        finally:
-            conn.close()
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         logger.warning("Failed to save summary: %s", e)
 
@@ -188,7 +231,6 @@ def _rotate_summaries(conn):
                 )""",
                 (MAX_SUMMARIES,),
             )
-            conn.commit()
     except (sqlite3.DatabaseError, sqlite3.OperationalError):
         pass
 
@@ -197,16 +239,13 @@ def get_recent_summaries(limit=5):
     """Get the N most recent session summaries."""
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
+        with _lock:
             rows = conn.execute(
                 "SELECT summary, decisions, files_modified, created_at "
                 "FROM summaries ORDER BY id DESC LIMIT ?",
                 (limit,),
             ).fetchall()
-            return list(reversed(rows))
-        finally:
-            conn.close()
+        return list(reversed(rows))
     except (sqlite3.DatabaseError, sqlite3.OperationalError):
         return []
 
@@ -217,17 +256,13 @@ def save_fact(content, category="general", source="user"):
         return
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
-            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        with _lock, conn:
+            now = _now_iso()
             conn.execute(
                 "INSERT INTO facts (category, content, source, created_at) "
                 "VALUES (?, ?, ?, ?)",
                 (category, content.strip(), source, now),
             )
-            conn.commit()
-        finally:
-            conn.close()
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         logger.warning("Failed to save fact: %s", e)
 
@@ -236,45 +271,58 @@ def get_active_facts():
     """Get all active facts."""
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
+        with _lock:
             rows = conn.execute(
                 "SELECT category, content FROM facts WHERE active = 1 ORDER BY category, id",
             ).fetchall()
-            return rows
-        finally:
-            conn.close()
+        return rows
     except (sqlite3.DatabaseError, sqlite3.OperationalError):
         return []
 
 
+def deactivate_facts(search):
+    """Deactivate active facts containing search (case-insensitive).
+
+    Returns the deactivated contents, or None if the database failed.
+    """
+    try:
+        conn = get_connection()
+        with _lock, conn:
+            rows = conn.execute(
+                "SELECT id, content FROM facts WHERE active = 1"
+            ).fetchall()
+            deactivated = []
+            for row in rows:
+                if search in row["content"].lower():
+                    conn.execute(
+                        "UPDATE facts SET active = 0 WHERE id = ?", (row["id"],)
+                    )
+                    deactivated.append(row["content"])
+            return deactivated
+    except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
+        logger.warning("Failed to forget fact: %s", e)
+        return None
+
+
 def save_task(title, status="pending", context=""):
     """Save or update a task."""
     if not title or not title.strip():
         return
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
-            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-            # Check if task with same title exists
-            existing = conn.execute(
-                "SELECT id FROM memory_tasks WHERE title = ?", (title.strip(),)
-            ).fetchone()
-            if existing:
-                conn.execute(
-                    "UPDATE memory_tasks SET status = ?, context = ?, updated_at = ? WHERE id = ?",
-                    (status, context, now, existing["id"]),
-                )
-            else:
+        with _lock, conn:
+            now = _now_iso()
+            # Update in place if a task with this title exists, else insert
+            cursor = conn.execute(
+                "UPDATE memory_tasks SET status = ?, context = ?, updated_at = ? WHERE title = ?",
+                (status, context, now, title.strip()),
+            )
+            if cursor.rowcount == 0:
                 conn.execute(
                     "INSERT INTO memory_tasks (title, status, context, created_at, updated_at) "
                     "VALUES (?, ?, ?, ?, ?)",
                     (title.strip(), status, context, now, now),
                 )
-            conn.commit()
-        finally:
-            conn.close()
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         logger.warning("Failed to save task: %s", e)
 
@@ -283,15 +331,12 @@ def get_active_tasks():
     """Get all non-completed tasks."""
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
+        with _lock:
             rows = conn.execute(
                 "SELECT title, status, context, updated_at FROM memory_tasks "
                 "WHERE status != 'done' ORDER BY id",
             ).fetchall()
-            return rows
-        finally:
-            conn.close()
+        return rows
     except (sqlite3.DatabaseError, sqlite3.OperationalError):
         return []
 
@@ -300,15 +345,11 @@ def complete_task(title):
     """Mark a task as done."""
     try:
         conn = get_connection()
-        try:
-            _init_memory_tables(conn)
-            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        with _lock, conn:
+            now = _now_iso()
             conn.execute(
                 "UPDATE memory_tasks SET status = 'done', updated_at = ? WHERE title = ?",
                 (now, title.strip()),
             )
-            conn.commit()
-        finally:
-            conn.close()
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         logger.warning("Failed to complete task: %s", e)
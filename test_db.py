@@ -1,4 +1,4 @@
-"""Tests for db.py deduplication logic."""
+"""Tests for db.py: deduplication, rotation, memory tables and schema migration."""
 
 import hashlib
 import os
@@ -14,8 +14,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 import db
 
 
-class TestDedup(unittest.TestCase):
-    """Test deduplication in an isolated in-memory DB."""
+class DBTestCase(unittest.TestCase):
+    """Base class: each test gets its own temp-file DB."""
 
     def setUp(self):
         """Patch DB_PATH to use a temp file for isolation."""
@@ -26,6 +26,9 @@ class TestDedup(unittest.TestCase):
 
     def tearDown(self):
         self.patcher.stop()
+        conn = db._connections.pop(self.tmp.name, None)
+        if conn is not None:
+            conn.close()
         os.unlink(self.tmp.name)
 
     def _count(self, content=None):
@@ -48,6 +51,10 @@ class TestDedup(unittest.TestCase):
         conn.close()
         return rows
 
+
+class TestDedup(DBTestCase):
+    """Test deduplication in an isolated DB."""
+
     # --- Basic save ---
 
     def test_save_message_basic(self):
@@ -57,7 +64,7 @@ class TestDedup(unittest.TestCase):
     def test_save_fills_content_hash_column(self):
         db.save_message("user", "hello", source="telegram")
         rows = self._get_rows("hello")
-        expected = hashlib.sha256(b"hello").hexdigest()[:16]
+        expected = hashlib.blake2b(b"hello", digest_size=8).hexdigest()
         self.assertEqual(rows[0][2], expected)
 
     def test_save_empty_content_skipped(self):
@@ -118,5 +125,66 @@ with patch.object(db, "DB_PATH", {self.tmp.name!r}):
         self.assertEqual(self._count("crossproc"), 1)
 
 
+class TestRotation(DBTestCase):
+    """Test that rotation keeps only the newest MAX_MESSAGES rows."""
+
+    def test_rotation_keeps_last_max_messages(self):
+        with patch.object(db, "MAX_MESSAGES", 3), patch.object(db, "ROTATE_EVERY", 4):
+            for i in range(8):
+                db.save_message("user", f"msg {i}", source="telegram")
+        conn = sqlite3.connect(self.tmp.name)
+        rows = conn.execute("SELECT content FROM messages ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual([r[0] for r in rows], ["msg 5", "msg 6", "msg 7"])
+
+
+class TestMemoryTables(DBTestCase):
+    """Test the facts and memory_tasks helpers."""
+
+    def test_deactivate_facts(self):
+        db.save_fact("Prefers short answers in French")
+        db.save_fact("Uses Python 3.13")
+        self.assertEqual(db.deactivate_facts("french"), ["Prefers short answers in French"])
+        self.assertEqual([r["content"] for r in db.get_active_facts()], ["Uses Python 3.13"])
+
+    def test_save_task_updates_existing_title(self):
+        db.save_task("Ship v2")
+        db.save_task("Ship v2", status="in_progress", context="tests left")
+        tasks = db.get_active_tasks()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual((tasks[0]["status"], tasks[0]["context"]), ("in_progress", "tests left"))
+
+
+class TestSchema(DBTestCase):
+    """Test schema versioning and legacy-column migration."""
+
+    def test_schema_version_recorded(self):
+        db.save_message("user", "hello", source="telegram")
+        conn = sqlite3.connect(self.tmp.name)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        self.assertEqual(version, db.SCHEMA_VERSION)
+
+    def test_legacy_metadata_backfilled(self):
+        conn = sqlite3.connect(self.tmp.name)
+        conn.execute(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, metadata TEXT, source TEXT DEFAULT 'claude-code')"
+        )
+        conn.execute(
+            "INSERT INTO messages (role, content, metadata) VALUES (?, ?, ?)",
+            ("user", "old", '{"session_id": "s1", "created_at": "2025-01-01T00:00:00.000000Z"}'),
+        )
+        conn.commit()
+        conn.close()
+        db.save_message("user", "new", source="telegram", session_id="s2")
+        rows = db.get_connection().execute(
+            "SELECT content, session_id, created_at FROM messages ORDER BY id"
+        ).fetchall()
+        self.assertEqual(tuple(rows[0]), ("old", "s1", "2025-01-01T00:00:00.000000Z"))
+        self.assertEqual(rows[1]["session_id"], "s2")
+        self.assertTrue(rows[1]["created_at"])
+
+
 if __name__ == "__main__":
     unittest.main()